@@ -1,5 +1,77 @@
+import array
 import hou
+import mmap
+import os
 import re
+import shutil
+import struct
+
+
+UDIM_PATTERN = re.compile(r"(<udim>|<UDIM>|<uvtile>|<UVTILE>)")
+
+EXR_MAGIC = b"\x76\x2f\x31\x01"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+# Header attributes that decide how an EXR stores its pixels
+EXR_FORMAT_ATTRIBUTES = ("channels", "compression", "dataWindow", "tiles", "lineOrder")
+
+# Flags every surface primitive that falls inside a stamp projection with the
+# lowest and highest UDIM its uvs reach. Input 1 holds one primitive per stamp
+# spanning the bounds of its projection, so primfind culls distant stamps
+# before the exact test against the stamp's edge axes.
+STAMPED_UDIMS_SNIPPET = """
+int pts[] = primpoints(0, @primnum);
+vector bmin = point(0, "P", pts[0]);
+vector bmax = bmin;
+foreach (int pt; pts) {
+    vector p = point(0, "P", pt);
+    bmin = min(bmin, p);
+    bmax = max(bmax, p);
+}
+vector centre = (bmin + bmax) * 0.5;
+float radius = length(bmax - bmin) * 0.5;
+
+int touched = 0;
+foreach (int stamp; primfind(1, bmin, bmax)) {
+    vector origin = prim(1, "origin", stamp);
+    vector axis_s = prim(1, "axis_s", stamp);
+    vector axis_t = prim(1, "axis_t", stamp);
+    vector2 s_range = prim(1, "s_range", stamp);
+    vector2 t_range = prim(1, "t_range", stamp);
+
+    float len_s = length(axis_s);
+    float len_t = length(axis_t);
+    vector offset = centre - origin;
+
+    float s = dot(offset, axis_s) / (len_s * len_s);
+    float pad_s = radius / len_s;
+    if (s + pad_s < s_range.x || s - pad_s > s_range.y)
+        continue;
+
+    float t = dot(offset, axis_t) / (len_t * len_t);
+    float pad_t = radius / len_t;
+    if (t + pad_t < t_range.x || t - pad_t > t_range.y)
+        continue;
+
+    touched = 1;
+    break;
+}
+
+i@stamp_udim_lo = 0;
+i@stamp_udim_hi = 0;
+if (touched) {
+    int vertex_uv = hasvertexattrib(0, "uv");
+    vector uvmin = {1e20, 1e20, 0};
+    vector uvmax = {-1e20, -1e20, 0};
+    foreach (int vtx; primvertices(0, @primnum)) {
+        vector uv = vertex_uv ? vertex(0, "uv", vtx) : point(0, "uv", vertexpoint(0, vtx));
+        uvmin = min(uvmin, uv);
+        uvmax = max(uvmax, uv);
+    }
+    i@stamp_udim_lo = 1001 + clamp(int(floor(uvmin.x)), 0, 9) + 10 * max(int(floor(uvmin.y)), 0);
+    i@stamp_udim_hi = 1001 + clamp(int(floor(uvmax.x)), 0, 9) + 10 * max(int(floor(uvmax.y)), 0);
+}
+"""
 
 
 def refresh_glcache(node):
@@ -7,12 +79,196 @@ def refresh_glcache(node):
     hou.hscript("texcache -c")
 
 
+def udim_from_uv(u, v):
+    return 1001 + int(u) + 10 * int(v)
+
+
+def projection_bounds(stamp_geo, surface_bbox):
+    # Each projection quad becomes one primitive whose points span its
+    # projection clipped to the surface bounds, carrying the quad's origin,
+    # edge axes and the extent of its points along those axes
+    bounds_geo = hou.Geometry()
+    for name, default in (
+        ("origin", (0.0, 0.0, 0.0)),
+        ("axis_s", (0.0, 0.0, 0.0)),
+        ("axis_t", (0.0, 0.0, 0.0)),
+        ("s_range", (0.0, 0.0)),
+        ("t_range", (0.0, 0.0)),
+    ):
+        bounds_geo.addAttrib(hou.attribType.Prim, name, default)
+
+    bbox_min = surface_bbox.minvec()
+    bbox_max = surface_bbox.maxvec()
+    bbox_corners = [
+        hou.Vector3(x, y, z)
+        for x in (bbox_min[0], bbox_max[0])
+        for y in (bbox_min[1], bbox_max[1])
+        for z in (bbox_min[2], bbox_max[2])
+    ]
+
+    for prim in stamp_geo.prims():
+        points = [vertex.point().position() for vertex in prim.vertices()]
+        if len(points) < 3:
+            continue
+
+        origin = points[0]
+        axis_s = points[1] - origin
+        axis_t = points[-1] - origin
+        len_s = axis_s.lengthSquared()
+        len_t = axis_t.lengthSquared()
+        normal = axis_s.cross(axis_t)
+        if len_s == 0.0 or len_t == 0.0 or normal.lengthSquared() == 0.0:
+            continue
+        normal = normal.normalized()
+
+        s_values = [(p - origin).dot(axis_s) / len_s for p in points]
+        t_values = [(p - origin).dot(axis_t) / len_t for p in points]
+
+        # The projection runs along the normal in both directions, so it only
+        # needs to reach as far as the surface bounds do
+        depths = [(corner - origin).dot(normal) for corner in bbox_corners]
+        corners = [p + normal * depth for p in points for depth in (min(depths), max(depths))]
+
+        bounds_prim = bounds_geo.createPolygon()
+        for corner in corners:
+            bounds_point = bounds_geo.createPoint()
+            bounds_point.setPosition(corner)
+            bounds_prim.addVertex(bounds_point)
+
+        bounds_prim.setAttribValue("origin", tuple(origin))
+        bounds_prim.setAttribValue("axis_s", tuple(axis_s))
+        bounds_prim.setAttribValue("axis_t", tuple(axis_t))
+        bounds_prim.setAttribValue("s_range", (min(s_values), max(s_values)))
+        bounds_prim.setAttribValue("t_range", (min(t_values), max(t_values)))
+
+    return bounds_geo
+
+
+def stamped_udims(node):
+    """Returns the set of UDIM names touched by at least one stamp projection."""
+    inputs = node.inputs()
+    if len(inputs) < 2 or inputs[0] is None or inputs[1] is None:
+        return set()
+
+    surface_geo = inputs[0].geometry()
+    if surface_geo.findVertexAttrib("uv") is None and surface_geo.findPointAttrib("uv") is None:
+        return set()
+
+    bounds_geo = projection_bounds(inputs[1].geometry(), surface_geo.boundingBox())
+    if len(bounds_geo.prims()) == 0:
+        return set()
+
+    sops = hou.sopNodeTypeCategory()
+    verb = sops.nodeVerb("attribwrangle")
+    verb.setParms({"class": 1, "snippet": STAMPED_UDIMS_SNIPPET})
+
+    flagged_geo = hou.Geometry()
+    verb.execute(flagged_geo, [surface_geo, bounds_geo])
+
+    # Unique tile spans are gathered in bulk, leaving only a handful to expand
+    spans = set(zip(
+        flagged_geo.primIntAttribValues("stamp_udim_lo"),
+        flagged_geo.primIntAttribValues("stamp_udim_hi"),
+    ))
+    spans.discard((0, 0))
+
+    udims = set()
+    for lo, hi in spans:
+        for tile_v in range((lo - 1001) // 10, (hi - 1001) // 10 + 1):
+            for tile_u in range((lo - 1001) % 10, (hi - 1001) % 10 + 1):
+                udims.add(str(udim_from_uv(tile_u, tile_v)))
+    return udims
+
+
+def background_passthrough(node):
+    # Untouched tiles are only copied from the background when the export
+    # would not convert the background colours in any way
+    if not node.parm("use_bg_texture").evalAsInt():
+        return False
+    if node.parm("bg_fromspace").evalAsString() != node.parm("bg_tospace").evalAsString():
+        return False
+    if node.parm("convertcolorspace").evalAsInt() != 0:
+        return False
+    if node.parm("gamma").evalAsFloat() != 1.0 or node.parm("lut").evalAsString():
+        return False
+    return True
+
+
+def image_format_signature(path):
+    # Reads the parts of an EXR or PNG header that describe the stored pixels:
+    # size, channels, bit depth, compression and layout. Other formats and
+    # unreadable files return None, so they are always composited instead.
+    try:
+        with open(path, "rb") as image:
+            header = image.read(65536)
+    except OSError:
+        return None
+
+    if header.startswith(PNG_MAGIC):
+        # IHDR is always the first chunk: size, bit depth, colour type and interlacing
+        return ("png", header[16:29])
+
+    if not header.startswith(EXR_MAGIC):
+        return None
+
+    signature = {"version": header[4:8]}
+    offset = 8
+    while offset < len(header):
+        name_end = header.find(b"\0", offset)
+        if name_end == -1:
+            return None
+        name = header[offset:name_end].decode("ascii", "replace")
+        if not name:
+            break
+
+        type_end = header.find(b"\0", name_end + 1)
+        if type_end == -1 or type_end + 4 > len(header):
+            return None
+        size = struct.unpack_from("<i", header, type_end + 1)[0]
+        value_start = type_end + 5
+        if name in EXR_FORMAT_ATTRIBUTES:
+            signature[name] = header[value_start:value_start + size]
+        offset = value_start + size
+
+    return ("exr", tuple(sorted(signature.items())))
+
+
+def background_tile_path(node, udim_name, output_path, reference_signature):
+    background = node.parm("texture_path").evalAsString()
+    background = re.sub(UDIM_PATTERN, udim_name, background)
+
+    if not os.path.isfile(background):
+        return None
+    if os.path.splitext(background)[1].lower() != os.path.splitext(output_path)[1].lower():
+        return None
+
+    # The copy has to be stored exactly like the tiles the ROP writes, so the
+    # UDIM set never mixes bit depths, channels or compression
+    if reference_signature is None or image_format_signature(background) != reference_signature:
+        return None
+    return background
+
+
+def copy_background_tile(node, udim_name, output_path, reference_signature):
+    background = background_tile_path(node, udim_name, output_path, reference_signature)
+    if not background:
+        return False
+
+    # Exporting over the background in place leaves nothing to copy
+    if os.path.exists(output_path) and os.path.samefile(background, output_path):
+        return True
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    shutil.copyfile(background, output_path)
+    return True
+
+
 def assign_output_file_parms(node):
     filename = node.parm("copoutput").evalAsString()
     all_udims = node.parm("export_all_udims").evalAsInt()
 
-    udim_pattern = re.compile(r"(<udim>|<UDIM>|<uvtile>|<UVTILE>)")
-
     cop_output_node = node.node("cop2net1").node("rop_comp1")
 
     udim_node = node.node("OUT_UDIM_ANALYSIS")
@@ -20,12 +276,12 @@ def assign_output_file_parms(node):
 
     output_udim = node.parm("display_udim").evalAsString()
 
-    udim_search = re.search(udim_pattern, filename)
+    udim_search = re.search(UDIM_PATTERN, filename)
 
     cop_output_parm = cop_output_node.parm("copoutput")
 
     if udim_search:
-        new_name_single = re.sub(udim_pattern, output_udim, filename)
+        new_name_single = re.sub(UDIM_PATTERN, output_udim, filename)
         cop_output_parm.set(new_name_single)
 
         if output_udim in udim_names:
@@ -36,17 +292,359 @@ def assign_output_file_parms(node):
     cop_output_node.parm("execute").pressButton()
 
     if len(udim_names) > 0 and all_udims and udim_search:
+        # Tiles without any stamp footprint skip the composite entirely and
+        # are copied whole from the background texture. The tile rendered
+        # above is the reference for the format the ROP writes.
+        passthrough = background_passthrough(node)
+        stamped = stamped_udims(node) if passthrough else set()
+        reference_signature = image_format_signature(new_name_single) if passthrough else None
+
         with hou.InterruptableOperation("Processing UDIMs", open_interrupt_dialog=True) as operation:
             for i, udim_name in enumerate(udim_names):
                 percent = float(i) / float(len(udim_names))
                 operation.updateProgress(percent)
 
+                new_name_multi = re.sub(UDIM_PATTERN, udim_name, filename)
+
+                if passthrough and udim_name not in stamped:
+                    if copy_background_tile(node, udim_name, new_name_multi, reference_signature):
+                        continue
+
                 node.parm("display_udim").set(udim_name)
 
-                new_name_multi = re.sub(udim_pattern, udim_name, filename)
                 cop_output_parm.set(new_name_multi)
 
                 cop_output_node.parm("execute").pressButton()
 
     node.parm("display_udim").set(output_udim)
     refresh_glcache(node)
+
+
+# Projection snapshots store a whole projection set as fixed width columns
+# so a file can be memory-mapped and copied straight into geometry
+SNAPSHOT_MAGIC = b"TXSTAMP\0"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sIIIIQQ")
+SNAPSHOT_COLUMN = struct.Struct("<16scIQ")
+SNAPSHOT_ALIGN = 64
+
+# Column name, array typecode, values per row (four corners per stamp for P, N and uv)
+SNAPSHOT_COLUMNS = (
+    ("P", "f", 12),
+    ("N", "f", 12),
+    ("uv", "f", 8),
+    ("stampcolor", "f", 3),
+    ("stamppath", "i", 1),
+    ("udim", "i", 1),
+    ("stampid", "i", 1),
+)
+
+def snapshot_udim(surface_geo, uv_attrib, centre, direction):
+    position = hou.Vector3()
+    normal = hou.Vector3()
+    uvw = hou.Vector3()
+    prim_num = surface_geo.intersect(centre, direction, position, normal, uvw)
+    if prim_num == -1:
+        prim_num = surface_geo.intersect(centre, -direction, position, normal, uvw)
+    if prim_num == -1:
+        return 0
+
+    uv = surface_geo.prim(prim_num).attribValueAtInterior(uv_attrib, uvw[0], uvw[1])
+    return udim_from_uv(max(uv[0], 0.0), max(uv[1], 0.0))
+
+
+def export_projection_snapshot(node, path):
+    """Writes the projection quads connected to the second input to a
+    snapshot file, and returns the number of stamps written.
+    """
+    inputs = node.inputs()
+    if len(inputs) < 2 or inputs[1] is None:
+        raise hou.OperationFailed("No projection primitives connected to the second input.")
+
+    stamp_geo = inputs[1].geometry()
+    surface_geo = inputs[0].geometry() if inputs[0] is not None else None
+
+    surface_uv = None
+    if surface_geo is not None:
+        surface_uv = surface_geo.findVertexAttrib("uv") or surface_geo.findPointAttrib("uv")
+
+    uv_attrib = stamp_geo.findVertexAttrib("uv")
+    point_uv = uv_attrib is None
+    if point_uv:
+        uv_attrib = stamp_geo.findPointAttrib("uv")
+    if uv_attrib is None:
+        raise hou.OperationFailed("Projection primitives have no uv attribute.")
+
+    non_quads = sum(1 for prim in stamp_geo.prims() if len(prim.vertices()) != 4)
+    if non_quads:
+        raise hou.OperationFailed(
+            f"{non_quads} projection primitives are not quads and can't be stored in a snapshot."
+        )
+
+    normal_attrib = stamp_geo.findPointAttrib("N")
+    color_attrib = stamp_geo.findPrimAttrib("stampcolor")
+    path_attrib = stamp_geo.findPrimAttrib("stamppath")
+
+    # Stamps keep the id they were loaded with, so versions exported from the
+    # same snapshot can be matched by id. Other layouts use primitive numbers.
+    id_attrib = stamp_geo.findPrimAttrib("stampid")
+    if id_attrib is not None and id_attrib.dataType() != hou.attribData.Int:
+        id_attrib = None
+
+    columns = {name: array.array(typecode) for name, typecode, width in SNAPSHOT_COLUMNS}
+    string_table = []
+    string_index = {}
+
+    for prim in stamp_geo.prims():
+        for vertex in prim.vertices():
+            point = vertex.point()
+            columns["P"].extend(tuple(point.position()))
+            uv = point.attribValue(uv_attrib) if point_uv else vertex.attribValue(uv_attrib)
+            columns["uv"].extend(uv[:2])
+            if normal_attrib is not None:
+                columns["N"].extend(point.attribValue(normal_attrib))
+            else:
+                columns["N"].extend(tuple(prim.normal()))
+
+        if color_attrib is not None:
+            columns["stampcolor"].extend(prim.attribValue(color_attrib))
+
+        if path_attrib is not None:
+            stamp_path = prim.attribValue(path_attrib)
+            if stamp_path not in string_index:
+                string_index[stamp_path] = len(string_table)
+                string_table.append(stamp_path)
+            columns["stamppath"].append(string_index[stamp_path])
+
+        udim = 0
+        if surface_uv is not None:
+            centre = prim.positionAtInterior(0.5, 0.5)
+            direction = -hou.Vector3(tuple(columns["N"][-3:])).normalized()
+            if node.parm("reverse_normals").evalAsInt():
+                direction = -direction
+            udim = snapshot_udim(surface_geo, surface_uv, centre, direction)
+        columns["udim"].append(udim)
+
+        columns["stampid"].append(prim.attribValue(id_attrib) if id_attrib is not None else prim.number())
+
+    count = len(columns["udim"])
+
+    # Columns for attributes missing on the input are left out entirely,
+    # so loading a snapshot gives back the same set of attributes
+    if color_attrib is None:
+        del columns["stampcolor"]
+    if path_attrib is None:
+        del columns["stamppath"]
+
+    written = [column for column in SNAPSHOT_COLUMNS if column[0] in columns]
+    strings = "\0".join(string_table).encode("utf-8")
+
+    offset = SNAPSHOT_HEADER.size + SNAPSHOT_COLUMN.size * len(written)
+    string_offset = offset
+    offset += len(strings)
+
+    directory = []
+    blobs = []
+    for name, typecode, width in written:
+        offset += -offset % SNAPSHOT_ALIGN
+        blob = columns[name].tobytes()
+        directory.append(SNAPSHOT_COLUMN.pack(name.encode("utf-8"), typecode.encode("ascii"), width, offset))
+        blobs.append((offset, blob))
+        offset += len(blob)
+
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(path, "wb") as snapshot:
+        snapshot.write(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC,
+            SNAPSHOT_VERSION,
+            count,
+            len(written),
+            len(string_table),
+            string_offset,
+            len(strings),
+        ))
+        for entry in directory:
+            snapshot.write(entry)
+        snapshot.write(strings)
+        for blob_offset, blob in blobs:
+            snapshot.write(b"\0" * (blob_offset - snapshot.tell()))
+            snapshot.write(blob)
+
+    return count
+
+
+def read_projection_snapshot(path):
+    """Memory-maps a snapshot file and returns a tuple of the stamp count,
+    the stamppath string table and a dictionary of column memoryviews.
+    """
+    with open(path, "rb") as snapshot:
+        data = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+
+    header = SNAPSHOT_HEADER.unpack_from(data, 0)
+    magic, version, count, column_count, string_count, string_offset, string_size = header
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise hou.OperationFailed(f"{path} is not a texture stamp projection snapshot.")
+
+    # The count is stored separately, as a table of one empty path is zero bytes long
+    strings = data[string_offset:string_offset + string_size].decode("utf-8")
+    string_table = strings.split("\0") if string_count else []
+
+    view = memoryview(data)
+    columns = {}
+    for i in range(column_count):
+        name, typecode, width, offset = SNAPSHOT_COLUMN.unpack_from(
+            data, SNAPSHOT_HEADER.size + SNAPSHOT_COLUMN.size * i
+        )
+        name = name.rstrip(b"\0").decode("utf-8")
+        typecode = typecode.decode("ascii")
+        size = count * width * array.array(typecode).itemsize
+        columns[name] = view[offset:offset + size].cast(typecode)
+
+    return count, string_table, columns
+
+
+def load_projection_snapshot(geo, path):
+    """Rebuilds the projection quads stored in a snapshot file into geo.
+    Numeric columns are copied into the attributes directly from the file.
+    """
+    count, string_table, columns = read_projection_snapshot(path)
+    if count == 0:
+        return
+
+    geo.createPoints([(0.0, 0.0, 0.0)] * (count * 4))
+    # Groups consecutive point numbers in fours, one quad per stamp
+    corners = iter(range(count * 4))
+    geo.createPolygons(list(zip(corners, corners, corners, corners)))
+
+    geo.setPointFloatAttribValuesFromString("P", columns["P"].tobytes(), hou.numericData.Float32)
+
+    geo.addAttrib(hou.attribType.Point, "N", (0.0, 0.0, 0.0))
+    geo.setPointFloatAttribValuesFromString("N", columns["N"].tobytes(), hou.numericData.Float32)
+
+    # uvs are stored as two floats per vertex and widened to the usual three
+    uvs = array.array("f", bytes(count * 4 * 3 * 4))
+    uvs[0::3] = array.array("f", columns["uv"][0::2])
+    uvs[1::3] = array.array("f", columns["uv"][1::2])
+    geo.addAttrib(hou.attribType.Vertex, "uv", (0.0, 0.0, 0.0))
+    geo.setVertexFloatAttribValuesFromString("uv", uvs.tobytes(), hou.numericData.Float32)
+
+    if "stampcolor" in columns:
+        geo.addAttrib(hou.attribType.Prim, "stampcolor", (1.0, 1.0, 1.0))
+        geo.setPrimFloatAttribValuesFromString(
+            "stampcolor", columns["stampcolor"].tobytes(), hou.numericData.Float32
+        )
+
+    if "stamppath" in columns:
+        geo.addAttrib(hou.attribType.Prim, "stamppath", "")
+        geo.setPrimStringAttribValues("stamppath", list(map(string_table.__getitem__, columns["stamppath"])))
+
+    geo.addAttrib(hou.attribType.Prim, "udim", 0)
+    geo.setPrimIntAttribValuesFromString("udim", columns["udim"].tobytes(), hou.numericData.Int32)
+
+    if "stampid" in columns:
+        geo.addAttrib(hou.attribType.Prim, "stampid", 0)
+        geo.setPrimIntAttribValuesFromString("stampid", columns["stampid"].tobytes(), hou.numericData.Int32)
+
+
+def import_projection_snapshot(node, path):
+    """Connects a Python SOP that loads the snapshot file to the second input,
+    so the projection set is read from disk instead of recooking node chains.
+    """
+    parent = node.parent()
+    snapshot_name = "texstamp_proj_snapshot"
+
+    input_node = node.input(1)
+    if input_node and input_node.name().startswith(snapshot_name):
+        snapshot_node = input_node
+    else:
+        snapshot_node = parent.createNode("python", snapshot_name)
+
+        parm_group = snapshot_node.parmTemplateGroup()
+        parm_group.append(hou.StringParmTemplate(
+            "snapshot_file", "Snapshot File", 1, string_type=hou.stringParmType.FileReference
+        ))
+        snapshot_node.setParmTemplateGroup(parm_group)
+
+        type_name = node.type().name()
+        snapshot_node.parm("python").set(
+            "node = hou.pwd()\n"
+            f"module = hou.nodeType(hou.sopNodeTypeCategory(), \"{type_name}\").hdaModule()\n"
+            "module.load_projection_snapshot(node.geometry(), node.evalParm(\"snapshot_file\"))\n"
+        )
+
+        node.setInput(1, snapshot_node, 0)
+        snapshot_node.moveToGoodPosition(relative_to_inputs=False)
+
+    snapshot_node.parm("snapshot_file").set(path)
+    return snapshot_node
+
+
+def snapshot_rows(count, string_table, columns):
+    # One hashable row per stamp holding every stored value except its id
+    parts = []
+    for name, typecode, width in SNAPSHOT_COLUMNS:
+        if name == "stampid" or name not in columns:
+            continue
+
+        column = columns[name]
+        if name == "stamppath":
+            parts.append(list(map(string_table.__getitem__, column)))
+            continue
+
+        row_size = width * column.itemsize
+        raw = column.cast("B")
+        parts.append([raw[i * row_size:(i + 1) * row_size].tobytes() for i in range(count)])
+
+    return list(zip(*parts)) if parts else [()] * count
+
+
+def diff_projection_snapshots(path_a, path_b):
+    """Compares two snapshot files and returns a dictionary with the stamp
+    indices that changed and were added in the second file, and the stamp
+    indices of the first file that were removed.
+
+    Stamps are matched by their stampid when both files have unique ids.
+    Otherwise they are matched by content, so an edited stamp is reported
+    as removed and added instead of changed.
+    """
+    count_a, strings_a, columns_a = read_projection_snapshot(path_a)
+    count_b, strings_b, columns_b = read_projection_snapshot(path_b)
+
+    rows_a = snapshot_rows(count_a, strings_a, columns_a)
+    rows_b = snapshot_rows(count_b, strings_b, columns_b)
+
+    ids_a = list(columns_a["stampid"]) if "stampid" in columns_a else []
+    ids_b = list(columns_b["stampid"]) if "stampid" in columns_b else []
+
+    if len(set(ids_a)) == count_a and len(set(ids_b)) == count_b and (count_a or count_b):
+        index_a = {stamp_id: i for i, stamp_id in enumerate(ids_a)}
+        index_b = {stamp_id: i for i, stamp_id in enumerate(ids_b)}
+        return {
+            "changed": [
+                i for i, stamp_id in enumerate(ids_b)
+                if stamp_id in index_a and rows_a[index_a[stamp_id]] != rows_b[i]
+            ],
+            "added": [i for i, stamp_id in enumerate(ids_b) if stamp_id not in index_a],
+            "removed": [i for i, stamp_id in enumerate(ids_a) if stamp_id not in index_b],
+        }
+
+    # Identical rows pair up in order, whatever is left over was added or removed
+    unmatched = {}
+    for i, row in enumerate(rows_a):
+        unmatched.setdefault(row, []).append(i)
+
+    added = []
+    for i, row in enumerate(rows_b):
+        if unmatched.get(row):
+            unmatched[row].pop(0)
+        else:
+            added.append(i)
+
+    return {
+        "changed": [],
+        "added": added,
+        "removed": sorted(i for indices in unmatched.values() for i in indices),
+    }
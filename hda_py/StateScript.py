@@ -1,3 +1,5 @@
+import os
+
 import hou
 import viewerstate.utils as vsu
 
@@ -12,6 +14,16 @@ class StampCursor(object):
     POSITION_GEOMETRY = 0
     POSITION_SCREEN = 1
 
+    # Point rows and columns the stamp image is downsampled to for the preview
+    PREVIEW_RES = 17
+    # Offset along the surface normal to stop the preview z-fighting the mesh
+    PREVIEW_OFFSET = 0.001
+    # Unit size downsampled stamp grids keyed by (stamp path, modified time,
+    # flip u, stamp colour), shared between state instances so re-entering
+    # the state is free. Only the most recent PREVIEW_CACHE_SIZE are kept.
+    PREVIEW_CACHE = {}
+    PREVIEW_CACHE_SIZE = 16
+
     def __init__(self, scene_viewer, state_name):
         self.scene_viewer = scene_viewer
         self.state_name = state_name
@@ -22,6 +34,12 @@ class StampCursor(object):
         self.pointer_drawable = self.init_pointer_drawable()
         self.line_drawable = self.init_line_drawable()
         self.quad_drawable = self.init_quad_drawable()
+        self.preview_drawable = self.init_preview_drawable()
+
+        self.preview_key = None
+        self.preview_geo = None
+
+        self.reverse_normals = False
 
         # xform is our location in geometry space
         self.xform = hou.Matrix4(self.SIZE)
@@ -182,17 +200,178 @@ class StampCursor(object):
 
         return cursor_draw
 
+    def init_preview_drawable(self):
+        cursor_draw = hou.GeometryDrawableGroup("preview")
+
+        cursor_draw.addDrawable(
+            hou.GeometryDrawable(
+                self.scene_viewer,
+                hou.drawableGeometryType.Face,
+                "face",
+                params={
+                    "color1": (1.0, 1.0, 1.0, 1.0),
+                    "use_cd": True,
+                },
+            )
+        )
+
+        return cursor_draw
+
+    def load_stamp_preview(
+        self,
+        stamp_path: str,
+        mtime: float,
+        flip_u: bool,
+        stamp_color: tuple,
+    ) -> hou.Geometry:
+        """Returns a unit size grid with the stamp image downsampled into its
+        point colours, or None if the image can't be read.
+
+        The grid is built once per stamp and then reused from PREVIEW_CACHE.
+        Including the modified time in the key picks up edits to the image.
+        """
+        key = (stamp_path, mtime, flip_u, stamp_color)
+        if key in self.PREVIEW_CACHE:
+            return self.PREVIEW_CACHE[key]
+
+        sops = hou.sopNodeTypeCategory()
+        verb = sops.nodeVerb("grid")
+
+        verb.setParms(
+            {
+                "type": 0,
+                "surftype": 4,
+                "orient": 2,
+                "size": hou.Vector2(1.0, 1.0),
+                "t": hou.Vector3(0.0, 0.0, 0.0),
+                "rows": self.PREVIEW_RES,
+                "cols": self.PREVIEW_RES
+            },
+        )
+
+        grid_geo = hou.Geometry()
+        verb.execute(grid_geo, [])
+
+        # Unwrap the same way as build_projection_primitive, so the preview
+        # samples the stamp with the uvs the HDA will cook with
+        unwrap_verb = sops.nodeVerb("uvunwrap")
+        unwrap_verb.setParms({"spacing": 0})
+
+        unwrap_geo = hou.Geometry()
+        unwrap_verb.execute(unwrap_geo, [grid_geo])
+
+        uv_attrib = unwrap_geo.findVertexAttrib("uv")
+        if uv_attrib is None:
+            return None
+
+        # uvunwrap writes vertex uvs, but Attribute from Map samples into the
+        # class of its uv attribute. The grid has no seams, so the uvs are
+        # moved onto the points to get point colours and alpha back.
+        uvs = [0.0] * (len(unwrap_geo.points()) * 3)
+        for prim in unwrap_geo.prims():
+            for vertex in prim.vertices():
+                uv = vertex.attribValue(uv_attrib)
+                index = vertex.point().number() * 3
+                uvs[index] = 1.0 - uv[0] if flip_u else uv[0]
+                uvs[index + 1] = uv[1]
+        uv_attrib.destroy()
+        unwrap_geo.addAttrib(hou.attribType.Point, "uv", (0.0, 0.0, 0.0))
+        unwrap_geo.setPointFloatAttribValues("uv", uvs)
+
+        # Sampling through a SOP verb keeps the preview off the GPU
+        # and leaves the HDA's own network untouched
+        map_verb = sops.nodeVerb("attribfrommap")
+        map_verb.setParms({"filename": stamp_path, "uvattrib": "uv"})
+
+        stamp_geo = hou.Geometry()
+        try:
+            map_verb.execute(stamp_geo, [unwrap_geo])
+        except hou.OperationFailed:
+            return None
+
+        if stamp_geo.findPointAttrib("Cd") is None:
+            return None
+
+        colors = list(stamp_geo.pointFloatAttribValues("Cd"))
+        for i in range(len(colors)):
+            colors[i] *= stamp_color[i % 3]
+        stamp_geo.setPointFloatAttribValues("Cd", colors)
+
+        if stamp_geo.findPointAttrib("Alpha") is None:
+            stamp_geo.addAttrib(hou.attribType.Point, "Alpha", 1.0)
+
+        if len(self.PREVIEW_CACHE) >= self.PREVIEW_CACHE_SIZE:
+            del self.PREVIEW_CACHE[next(iter(self.PREVIEW_CACHE))]
+
+        self.PREVIEW_CACHE[key] = stamp_geo
+        return stamp_geo
+
+    def update_stamp(self, stamp_path: str, flip_u: bool, stamp_color: tuple) -> None:
+        """Sets the stamp image and colour shown by the preview drawable."""
+        # Paths Houdini resolves itself, such as opdef: paths, can't be
+        # checked for edits and are only loaded once
+        try:
+            mtime = os.path.getmtime(stamp_path)
+        except OSError:
+            mtime = None
+
+        key = (stamp_path, mtime, bool(flip_u), tuple(stamp_color))
+        if key == self.preview_key:
+            return
+
+        self.preview_key = key
+        self.preview_geo = self.load_stamp_preview(*key)
+
+    def update_stamp_preview(self, intersect_geometry: hou.Geometry) -> None:
+        """Projects the cached stamp grid from the projection quad onto the
+        surface under the cursor, following the quad normal like the HDA does.
+        """
+        if self.preview_geo is None:
+            return
+
+        quad_xform = self.quad_xform() * self.xform
+        direction = (hou.Vector3(0, -1, 0) * self.xform - hou.Vector3(0, 0, 0) * self.xform).normalized()
+        if self.reverse_normals:
+            direction = -direction
+
+        positions = []
+        alphas = list(self.preview_geo.pointFloatAttribValues("Alpha"))
+
+        hit_pos = hou.Vector3()
+        hit_normal = hou.Vector3()
+        hit_uvw = hou.Vector3()
+        for i, point in enumerate(self.preview_geo.points()):
+            origin = point.position() * quad_xform
+            prim_num = intersect_geometry.intersect(origin, direction, hit_pos, hit_normal, hit_uvw)
+            if prim_num == -1:
+                positions.extend((origin[0], origin[1], origin[2]))
+                alphas[i] = 0.0
+                continue
+
+            projected = hit_pos + hit_normal.normalized() * self.PREVIEW_OFFSET
+            positions.extend((projected[0], projected[1], projected[2]))
+
+        projected_geo = hou.Geometry()
+        projected_geo.merge(self.preview_geo)
+        projected_geo.setPointFloatAttribValues("P", positions)
+        projected_geo.setPointFloatAttribValues("Alpha", alphas)
+
+        self.preview_drawable.setGeometry(projected_geo)
+        self.preview_drawable.setTransform(self.model_xform)
+
     def show(self):
         """Enable the drawable"""
         self.pointer_drawable.show(True)
         self.line_drawable.show(True)
         self.quad_drawable.show(True)
+        self.preview_drawable.show(self.preview_geo is not None)
 
     def hide(self):
         """Disable the drawable"""
         self.pointer_drawable.show(False)
         self.line_drawable.show(False)
         self.quad_drawable.show(False)
+        self.preview_drawable.show(False)
 
     def update_position(
         self,
@@ -242,6 +421,9 @@ class StampCursor(object):
 
         self.update_xform(srt)
 
+        if hit:
+            self.update_stamp_preview(intersect_geometry)
+
         return hit
 
     def update_xform(self, srt: dict) -> None:
@@ -253,16 +435,7 @@ class StampCursor(object):
             current_srt.update(srt)  # Update with new world space coordinates
             self.xform = hou.hmath.buildTransform(current_srt)
 
-            translation_srt = {
-                "translate": (
-                    0,
-                    self.last_line_height,
-                    0,
-                ),
-                "scale": (self.last_quad_size.x(), 1, self.last_quad_size.y()),
-                "rotate": (0, 0, 0),
-            }
-            translation_xform = hou.hmath.buildTransform(translation_srt, transform_order="trs")
+            translation_xform = self.quad_xform()
 
             scale_srt = {
                 "translate": (
@@ -281,6 +454,19 @@ class StampCursor(object):
         except hou.OperationFailed:
             return
 
+    def quad_xform(self) -> hou.Matrix4:
+        """Returns the projection quad transform relative to the cursor."""
+        translation_srt = {
+            "translate": (
+                0,
+                self.last_line_height,
+                0,
+            ),
+            "scale": (self.last_quad_size.x(), 1, self.last_quad_size.y()),
+            "rotate": (0, 0, 0),
+        }
+        return hou.hmath.buildTransform(translation_srt, transform_order="trs")
+
     def update_model_xform(self, viewport: hou.GeometryViewport) -> None:
         """Update attribute model_xform by the selected viewport.
         This will vary depending on our position type.
@@ -303,6 +489,7 @@ class StampCursor(object):
         self.pointer_drawable.draw(handle)
         self.line_drawable.draw(handle)
         self.quad_drawable.draw(handle)
+        self.preview_drawable.draw(handle)
 
     def show_prompt(self) -> None:
         """Write the tool prompt used in the viewer state"""
@@ -314,6 +501,9 @@ class StampCursor(object):
     def update_quad_size(self, new_size: hou.Vector2) -> None:
         self.last_quad_size = new_size
 
+    def update_reverse_normals(self, reverse: bool) -> None:
+        self.reverse_normals = bool(reverse)
+
 
 class State(object):
 
@@ -376,6 +566,8 @@ class State(object):
             return
         self.last_mouse_point, self.last_mouse_dir = ui_event.ray()
 
+        self.resize_viewer_handle(node)
+
         self.cursor.update_model_xform(ui_event.curViewport())
 
         hit = self.cursor.update_position(
@@ -384,7 +576,6 @@ class State(object):
             mouse_dir=self.last_mouse_dir,
             intersect_geometry=geometry,
         )
-        self.resize_viewer_handle(node)
 
         if hit:
             self.cursor.show()
@@ -409,6 +600,12 @@ class State(object):
             hou.Vector2(self.grid_sizex, self.grid_sizey)
         )
         self.cursor.update_line_height(self.grid_dist)
+        self.cursor.update_reverse_normals(node.parm("reverse_normals").evalAsInt())
+        self.cursor.update_stamp(
+            node.parm("stamppath_default").evalAsString(),
+            node.parm("flip_u").evalAsInt(),
+            (1.0, 1.0, 1.0),
+        )
 
     def onDraw(self, kwargs):
         """ This callback is used for rendering the drawables
@@ -445,6 +642,8 @@ class State(object):
             pass
         self.set_size_cursor(node, dist)
 
+        self.resize_viewer_handle(node)
+
         self.cursor.update_model_xform(ui_event.curViewport())
 
         hit = self.cursor.update_position(
@@ -453,7 +652,6 @@ class State(object):
             mouse_dir=self.last_mouse_dir,
             intersect_geometry=geometry,
         )
-        self.resize_viewer_handle(node)
 
         if ui_event.reason() == hou.uiEventReason.Changed:
             # closes the current brush undo block
@@ -503,6 +701,8 @@ class State(object):
 
             geometry = node.geometry()
 
+            self.resize_viewer_handle(node)
+
             self.cursor.update_model_xform(ui_event.curViewport())
 
             hit = self.cursor.update_position(
@@ -511,7 +711,6 @@ class State(object):
                 mouse_dir=self.last_mouse_dir,
                 intersect_geometry=geometry,
             )
-            self.resize_viewer_handle(node)
 
 
     def set_size_cursor(self, node: hou.Node, dist: float) -> None: